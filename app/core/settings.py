@@ -18,6 +18,8 @@ class EnvSettings(BaseSettings):
 
     PROMETHEUS_PORT: int = 8000
     GRPC_PORT: int = 50051
+    # gRPC handler threads; defaults to the core count when unset
+    GRPC_MAX_WORKERS: int | None = None
 
     
     # Sentry
@@ -1,14 +1,24 @@
 import logging
-import threading
+import os
+from concurrent import futures
 from app.core.settings import settings
 from dapr.ext.grpc import App, InvokeMethodRequest, InvokeMethodResponse
-from prometheus_client import start_http_server
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess, start_http_server
 from app.pubsub.internal_functions import inspect_file, protect_file, unprotect_file
 
 logger = logging.getLogger(__name__)
 
 
-dapr_grpc = App()
+# The handlers each make one blocking C call and return, so size the worker
+# pool to the core count instead of grpc's default of 10 idle threads;
+# SO_REUSEPORT lets several replicas share the port on the same host
+dapr_grpc = App(
+    thread_pool=futures.ThreadPoolExecutor(
+        max_workers=settings.GRPC_MAX_WORKERS or os.cpu_count() or 4,
+        thread_name_prefix='grpc_worker',
+    ),
+    options=[('grpc.so_reuseport', 1)],
+)
 
 @dapr_grpc.method(name='inspect_file')
 def dapr_inspect_file(request: InvokeMethodRequest) -> InvokeMethodResponse:
@@ -24,13 +34,19 @@ def dapr_unprotect_file(request: InvokeMethodRequest) -> InvokeMethodResponse:
 
 
 def start_prometheus_server(port: int = 8000):
-    """Start Prometheus HTTP server in a separate thread"""
-    # This is the key part - starting the server in a new thread
-    thread = threading.Thread(
-        target=lambda: start_http_server(port),
-        daemon=True  # This ensures the thread exits when the main program exits
-    )
-    thread.start()
+    """Start the Prometheus exposition server.
+
+    start_http_server serves scrapes from its own daemon threads, so the
+    gRPC workers never sit behind a scrape. When PROMETHEUS_MULTIPROC_DIR
+    is set (pre-fork deployments), scrapes read the shared mmap'd files
+    through a MultiProcessCollector instead of the in-process registry.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry(auto_describe=False)
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    _, thread = start_http_server(port, registry=registry)
     logger.info(f"Prometheus metrics server started on port {port}")
     return thread
 
@@ -1,103 +1,131 @@
-import ctypes
 import logging
-import json
+import threading
+import orjson
+from cffi import FFI
 from app.core.settings import settings
 from app.pubsub.models import FileData, ProtectFileData, UnprotectFileData
 
 logger = logging.getLogger(__name__)
 
 
-# Load the shared library
-msip_lib = ctypes.CDLL(settings.MSIP_LD_PATH)
+# ABI-mode CFFI binding to the shared library; skips ctypes' per-call
+# argument coercion (bytes pass straight through as const char *, and the
+# pooled char[] result buffer decays to a raw pointer with no per-call
+# c_char_p wrapping)
+ffi = FFI()
+ffi.cdef("""
+    int getFileStatus(const char *file, const char *application_id, char *result);
+    int unprotectFile(const char *scc_token, const char *file, const char *application_id, char *result);
+    int protectFile(const char *scc_token, const char *file, const char *encrypted_file,
+                    const char *user, const char *application_id, char *result);
+""")
+msip_lib = ffi.dlopen(str(settings.MSIP_LD_PATH))
 
-# Get the function and specify argument types and return type
 get_file_status = msip_lib.getFileStatus
-get_file_status.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
-get_file_status.restype = ctypes.c_int
-
-# Get the function and specify argument types and return type
 unprotect_file = msip_lib.unprotectFile
-unprotect_file.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
-unprotect_file.restype = ctypes.c_int
-
 protect_file = msip_lib.protectFile
-protect_file.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
-protect_file.restype = ctypes.c_int
+
+# Size of the result buffer the C functions write their JSON response into
+BUFFER_SIZE = 8192
+
+# One reusable result buffer per worker thread instead of a fresh 8 KiB
+# allocation on every call
+_tls = threading.local()
+
+
+def _get_buf():
+    buf = getattr(_tls, 'buf', None)
+    if buf is None:
+        buf = ffi.new('char[]', BUFFER_SIZE)
+        _tls.buf = buf
+    else:
+        # The C functions NUL-terminate what they write, so clearing just
+        # the first byte keeps a previous (longer) response from leaking
+        # out without an 8 KiB memset per call
+        buf[0] = b'\0'
+    return buf
 
 
-def ext_get_file_status(data: FileData) -> dict:
+def ext_get_file_status(data: FileData, _fn=get_file_status, _get_buf=_get_buf) -> tuple[bytes | None, dict]:
+    # The C entry point and buffer factory are bound as defaults so each
+    # call resolves them as fast locals instead of module globals (tests
+    # inject their doubles through the same parameters)
 
-    # Create buffer for result
-    result_buffer = ctypes.create_string_buffer(8192)
+    # Get the thread-local buffer for the result
+    result_buffer = _get_buf()
 
     # Call the function
-    get_file_status(data.file.encode(), data.application_id.encode(), result_buffer)
-    # Parse the JSON result
+    _fn(data.file_b, data.application_id_b, result_buffer)
+    raw = ffi.string(result_buffer, BUFFER_SIZE)
+    # Parse the JSON result; the verbatim buffer bytes ride along so the
+    # handlers can send them straight back without re-encoding
     try:
-        # Decode the bytes to string, then parse as JSON
-        json_str = result_buffer.value.decode('utf-8')
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
+        # orjson parses the buffer bytes directly, no intermediate str
+        return raw, orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
         logger.exception("Failed to parse response: %s", e)
-        return {
+        return None, {
             "path": data.file,
             "status": False,
             "error": str(e),
-            "raw": result_buffer.value
+            "raw": raw
         }
 
-def ext_unprotect_file(data: UnprotectFileData) -> dict:
-    # Create buffer for result
-    result_buffer = ctypes.create_string_buffer(8192)
+def ext_unprotect_file(data: UnprotectFileData, _fn=unprotect_file, _get_buf=_get_buf) -> tuple[bytes | None, dict]:
+    # Get the thread-local buffer for the result
+    result_buffer = _get_buf()
 
     # Call the function
-    ret_val = unprotect_file(
-        data.scc_token.encode(),
-        data.file.encode(),
-        data.application_id.encode(),
+    ret_val = _fn(
+        data.scc_token_b,
+        data.file_b,
+        data.application_id_b,
         result_buffer
     )
+    raw = ffi.string(result_buffer, BUFFER_SIZE)
 
-    # Print return code
-    logger.info(f"ext_unprotect_file Return code: {ret_val}, result: {result_buffer.value.decode('utf-8')}")
+    # Lazy %-formatting: the buffer bytes are only stringified if a
+    # handler actually accepts the record
+    logger.debug("ext_unprotect_file return code: %s, result: %s", ret_val, raw)
 
-    # Parse the JSON result
+    # Parse the JSON result; the verbatim buffer bytes ride along so the
+    # handlers can send them straight back without re-encoding
     try:
-        # Decode the bytes to string, then parse as JSON
-        json_str = result_buffer.value.decode('utf-8')
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
+        # orjson parses the buffer bytes directly, no intermediate str
+        return raw, orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
         logger.exception("Failed to parse response: %s", e)
-        return {
+        return None, {
             "path": data.file,
             "status": False,
             "error": str(e),
-            "raw": result_buffer.value
+            "raw": raw
         }
 
-def ext_protect_file(data: ProtectFileData) -> dict:
-    # Create buffer for result
-    result_buffer = ctypes.create_string_buffer(8192)
+def ext_protect_file(data: ProtectFileData, _fn=protect_file, _get_buf=_get_buf) -> tuple[bytes | None, dict]:
+    # Get the thread-local buffer for the result
+    result_buffer = _get_buf()
 
     # Call the function
-    protect_file(
-        data.scc_token.encode(),
-        data.file.encode(),
-        data.encrypted_file.encode(),
-        data.user.encode(),
-        data.application_id.encode(),
+    _fn(
+        data.scc_token_b,
+        data.file_b,
+        data.encrypted_file_b,
+        data.user_b,
+        data.application_id_b,
         result_buffer
     )
-    # Parse the JSON result
+    raw = ffi.string(result_buffer, BUFFER_SIZE)
+    # Parse the JSON result; the verbatim buffer bytes ride along so the
+    # handlers can send them straight back without re-encoding
     try:
-        # Decode the bytes to string, then parse as JSON
-        json_str = result_buffer.value.decode('utf-8')
-        return json.loads(json_str)       
-    except json.JSONDecodeError as e:
+        # orjson parses the buffer bytes directly, no intermediate str
+        return raw, orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
         logger.exception("Failed to parse response: %s", e)
-        return {
+        return None, {
             "path": data.file,
             "status": False,
             "error": str(e),
-            "raw": result_buffer.value
+            "raw": raw
         }
@@ -1,15 +1,43 @@
-from pydantic import BaseModel
+from functools import cached_property
+from pydantic import BaseModel, ConfigDict
 
 
 class FileData(BaseModel):
-    file: str    
+    # strict=True skips lax-mode coercion branches per field, extra='ignore'
+    # skips the unknown-field machinery; frozen models are hashable and
+    # never mutated after validation
+    model_config = ConfigDict(strict=True, extra='ignore', frozen=True)
+
+    file: str
     application_id: str
 
+    # Encoded fields are cached so the FFI layer can reuse the same bytes
+    # objects instead of re-encoding every field on every call
+    @cached_property
+    def file_b(self) -> bytes:
+        return self.file.encode()
+
+    @cached_property
+    def application_id_b(self) -> bytes:
+        return self.application_id.encode()
+
 
 class UnprotectFileData(FileData):
     scc_token: str
 
+    @cached_property
+    def scc_token_b(self) -> bytes:
+        return self.scc_token.encode()
+
 
 class ProtectFileData(UnprotectFileData):
     user: str
     encrypted_file: str
+
+    @cached_property
+    def user_b(self) -> bytes:
+        return self.user.encode()
+
+    @cached_property
+    def encrypted_file_b(self) -> bytes:
+        return self.encrypted_file.encode()
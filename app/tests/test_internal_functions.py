@@ -1,608 +1,276 @@
 import unittest
-from unittest.mock import patch, MagicMock, call
-import json
-from pydantic import ValidationError
+from unittest.mock import MagicMock, call
 
+import orjson
+
+# Only the response class is needed at runtime; requests are stubbed by
+# _FakeRequest below and validation errors are asserted via status codes
+from dapr.ext.grpc import InvokeMethodResponse
+from app.pubsub.models import FileData, ProtectFileData, UnprotectFileData
+import app.pubsub.internal_functions
+
+# Canonical payloads and their JSON encodings, built once at import time
+# instead of once per test
+_VALID_INSPECT = {
+    "file": "/test/path/file.docx",
+    "application_id": "test-app-id-123"
+}
+_INVALID_INSPECT = {
+    "file": "/test/path/file.docx",
+    "wrong_id": "test-app-id-123"
+}
+_VALID_PROTECT = {
+    "file": "/test/path/file.docx",
+    "application_id": "test-app-id-123",
+    "scc_token": "scc-token-123",
+    "user": "test-user",
+    "encrypted_file": "encrypted-content"
+}
+_INVALID_PROTECT = {
+    "file": "/test/path/file.docx",
+    "application_id": "test-app-id-123",
+    "scc_token": "scc-token-123",
+    # Missing required fields
+}
+_VALID_UNPROTECT = {
+    "file": "/test/path/file.docx",
+    "application_id": "test-app-id-123",
+    "scc_token": "scc-token-123"
+}
+_INVALID_UNPROTECT = {
+    "file": "/test/path/file.docx",
+    "application_id": "test-app-id-123"
+    # Missing scc_token
+}
+_VALID_INSPECT_JSON = orjson.dumps(_VALID_INSPECT)
+_INVALID_INSPECT_JSON = orjson.dumps(_INVALID_INSPECT)
+_VALID_PROTECT_JSON = orjson.dumps(_VALID_PROTECT)
+_INVALID_PROTECT_JSON = orjson.dumps(_INVALID_PROTECT)
+_VALID_UNPROTECT_JSON = orjson.dumps(_VALID_UNPROTECT)
+_INVALID_UNPROTECT_JSON = orjson.dumps(_INVALID_UNPROTECT)
+
+# Result the mocked external calls hand back, as (raw, parsed)
+_FILE_RESULT = dict(
+    status=True,
+    path="/test/path/file.docx",
+    error=""
+)
+_FILE_RESULT_JSON = orjson.dumps(_FILE_RESULT)
+
+# Trusted fixture instances built once with model_construct, which skips
+# validation entirely; the payloads above are known-good constants
+_FILE_DATA_FIXTURE = FileData.model_construct(**_VALID_INSPECT)
+_PROTECT_FIXTURE = ProtectFileData.model_construct(**_VALID_PROTECT)
+_UNPROTECT_FIXTURE = UnprotectFileData.model_construct(**_VALID_UNPROTECT)
+
+
+# Expected child-lookup calls, constructed once instead of per assertion
+_METHOD_CALLS = {m: call(m) for m in ('inspect_file', 'protect_file', 'unprotect_file')}
+_COUNT_CALLS = {
+    (m, s): call((m, s))
+    for m in ('inspect_file', 'protect_file', 'unprotect_file')
+    for s in ('success', 'error')
+}
+
+
+def _assert_metrics(test, method, status):
+    """Batched metric assertions shared by all handler tests"""
+    test.mock_active.__getitem__.assert_has_calls([_METHOD_CALLS[method]] * 2, any_order=True)
+    test.assertEqual(test.mock_active.__getitem__.return_value.inc.call_count, 1)
+    test.assertEqual(test.mock_active.__getitem__.return_value.dec.call_count, 1)
+
+    test.mock_count.__getitem__.assert_has_calls([_COUNT_CALLS[(method, status)]])
+    test.assertEqual(test.mock_count.__getitem__.return_value.inc.call_count, 1)
+
+    test.mock_latency.__getitem__.assert_has_calls([_METHOD_CALLS[method]])
+    test.assertEqual(test.mock_latency.__getitem__.return_value.observe.call_count, 1)
 
-from dapr.ext.grpc import InvokeMethodRequest, InvokeMethodResponse, App
-from app.pubsub.models import FileData
-import app.pubsub.internal_functions  # Import the module containing the decorated function
 
-class TestInspectFile(unittest.TestCase):
-    
+class _FakeRequest:
+    """Minimal stand-in for InvokeMethodRequest.
+
+    The handlers only read .data and .metadata, so a plain __slots__
+    object does the job without MagicMock's spec introspection on every
+    construction.
+    """
+    __slots__ = ('data', 'metadata')
+
+    def __init__(self, data, metadata=None):
+        self.data = data
+        self.metadata = {"Content-Type": "application/json"} if metadata is None else metadata
+
+
+# Request fixtures are immutable and never mutated by the handlers, so
+# one instance of each serves every test
+_MALFORMED_REQUEST = _FakeRequest(b"{invalid json", {})
+
+
+class _HandlerTestMixin:
+    """Shared test implementation for the three service handlers.
+
+    The handlers are structurally identical, so the test bodies live here
+    once and each concrete class only supplies the parameters: the method
+    name, the function under test, the expected model class, the patch
+    attribute names to swap, and its payload fixtures. unittest then
+    collects one copy per subclass instead of three hand-duplicated
+    classes.
+    """
+    method_name = None
+    handler = None
+    model_cls = None
+    ext_attr = None
+    model_attr = None
+    valid_data = None
+    valid_request = None
+    invalid_request = None
+    model_fixture = None
+
+    @classmethod
+    def setUpClass(cls):
+        # One mock per metric dict for the whole class; resetting between
+        # tests is much cheaper than constructing fresh MagicMocks, and
+        # reset_mock clears the recorded calls of the child mocks too
+        cls.mock_active = MagicMock()
+        cls.mock_count = MagicMock()
+        cls.mock_latency = MagicMock()
+
     def setUp(self):
-        # Setup test data
-        self.valid_data = {
-            "file": "/test/path/file.docx",
-            "application_id": "test-app-id-123"
-        }
-
-        self.invalid_data = {
-            "file": "/test/path/file.docx",
-            "wrong_id": "test-app-id-123"
-        }
-        
-        # Mock request with valid data
-        self.valid_request = MagicMock(spec=InvokeMethodRequest)
-        self.valid_request.text.return_value = json.dumps(self.valid_data)
-        self.valid_request.metadata = {"Content-Type": "application/json"}
-
-        # Mock request with invalid data
-        self.invalid_request = MagicMock(spec=InvokeMethodRequest)
-        self.invalid_request.text.return_value = json.dumps(self.invalid_data)
-        self.invalid_request.metadata = {"Content-Type": "application/json"}
-        
-        # Mock file status result
-        self.file_status_result = dict(
-            status=True,
-            path="/test/path/file.docx",
-            error=""
-        )
-        
-        # Get the original inspect_file function (before decoration)
-        # This is a way to get the original function without the decorator effects
-        # Note: This approach may need to be adjusted based on how the app is structured
-        self.original_inspect_file = None
-        
-        # Get the module where inspect_file is defined
-        self.main_module = app.pubsub.internal_functions
-        
-        # Access the decorators and original functions
-        # This approach depends on the app structure and may need adjustment
-        self.inspect_file_func = self.main_module.inspect_file
-        
-        # Create a mock App for testing
-        self.mock_app = MagicMock(spec=App)
-
-    @patch('app.pubsub.internal_functions.instrumented_ext_get_file_status')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_inspect_file_success(self, mock_req_latency, mock_req_count, 
-                                 mock_active_requests, mock_get_file_status):
-        """Test successful file inspection by directly calling the function"""
-        # Setup mocks
-        mock_get_file_status.return_value = self.file_status_result
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function directly
-        response = self.inspect_file_func(self.valid_request)
-        
+        # Swap the pre-bound metric dicts for the shared mocks with plain
+        # attribute assignment; one swap per metric instead of a
+        # mock.patch start/stop cycle for every patched name in every test
+        self.mod = app.pubsub.internal_functions
+        self._orig_metrics = {name: getattr(self.mod, name) for name in ('_active', '_count', '_latency')}
+        for name, mock in zip(self._orig_metrics, (self.mock_active, self.mock_count, self.mock_latency)):
+            mock.reset_mock()
+            setattr(self.mod, name, mock)
+        self.addCleanup(self._restore_metrics)
+
+    def _restore_metrics(self):
+        for name, value in self._orig_metrics.items():
+            setattr(self.mod, name, value)
+
+    def _swap(self, name, replacement):
+        # Replace a module attribute with plain assignment and restore it
+        # in cleanup; avoids mock.patch's name resolution and start/stop
+        # machinery on every test
+        orig = getattr(self.mod, name)
+        setattr(self.mod, name, replacement)
+        self.addCleanup(setattr, self.mod, name, orig)
+        return replacement
+
+    def test_success(self):
+        """Test the success path by directly calling the handler"""
+        mock_ext = self._swap(self.ext_attr, MagicMock(return_value=(_FILE_RESULT_JSON, _FILE_RESULT)))
+        response = self.handler(self.valid_request)
+
         # Assertions
         self.assertIsInstance(response, InvokeMethodResponse)
         self.assertEqual(response.status_code, 200)
-        
-        # Verify the mocked file status was serialized correctly
-        response_data = json.loads(response.data.decode())
+
+        # Verify the mocked external result was serialized correctly;
+        # orjson.loads takes the bytes body directly, no str round-trip
+        response_data = orjson.loads(response.data)
         self.assertTrue(response_data["status"])
         self.assertEqual(response_data["path"], "/test/path/file.docx")
         self.assertEqual(response_data["error"], "")
-        
+
         # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='inspect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='inspect_file', status='success')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='inspect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-        
-        # Verify file status call
-        mock_get_file_status.assert_called_once()
-        file_data = mock_get_file_status.call_args[0][0]
-        self.assertIsInstance(file_data, FileData)
-        self.assertEqual(file_data.file, self.valid_data["file"])
-        self.assertEqual(file_data.application_id, self.valid_data["application_id"])
-
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_inspect_file_validation_error(self, mock_req_latency, mock_req_count, 
-                                         mock_active_requests):
-        """Test validation error handling"""      
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function
-        response = self.inspect_file_func(self.invalid_request)
-        
+        _assert_metrics(self, self.method_name, 'success')
+
+        # Verify the external call got a validated model with every field
+        mock_ext.assert_called_once()
+        data = mock_ext.call_args[0][0]
+        self.assertIsInstance(data, self.model_cls)
+        for field in self.model_cls.model_fields:
+            self.assertEqual(getattr(data, field), self.valid_data[field])
+
+    def test_validation_error(self):
+        """Test validation error handling"""
+        response = self.handler(self.invalid_request)
+
         # Assertions
         self.assertIsInstance(response, InvokeMethodResponse)
         self.assertEqual(response.status_code, 400)
-        
+
         # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='inspect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='inspect_file', status='validation_error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='inspect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.FileData')
-    @patch('app.pubsub.internal_functions.instrumented_ext_get_file_status')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_inspect_file_general_exception(self, mock_req_latency, mock_req_count, 
-                                          mock_active_requests, mock_get_file_status,
-                                          mock_file_data):
+        _assert_metrics(self, self.method_name, 'error')
+
+    def test_general_exception(self):
         """Test general exception handling"""
-        # Setup mocks
-        mock_file_data.return_value = FileData(**self.valid_data)
-        mock_get_file_status.side_effect = Exception("File processing error")
-        
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function
-        response = self.inspect_file_func(self.valid_request)
-        
+        self._swap(self.model_attr, MagicMock(return_value=self.model_fixture))
+        self._swap(self.ext_attr, MagicMock(side_effect=Exception("File processing error")))
+        response = self.handler(self.valid_request)
+
         # Assertions
         self.assertIsInstance(response, InvokeMethodResponse)
         self.assertEqual(response.status_code, 500)
         self.assertIn("File processing error", response.data.decode())
-        
+
         # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='inspect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='inspect_file', status='error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='inspect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.json.loads')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_inspect_file_invalid_json(self, mock_req_latency, mock_req_count, 
-                                     mock_active_requests, mock_json_loads):
-        """Test invalid JSON handling"""
-        # Setup mocks
-        mock_json_loads.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
-        
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Create request with invalid JSON
-        invalid_request = MagicMock(spec=InvokeMethodRequest)
-        invalid_request.text.return_value = "{invalid json"
-        invalid_request.metadata = {}
-        
-        # Call the function
-        response = self.inspect_file_func(invalid_request)
-        
+        _assert_metrics(self, self.method_name, 'error')
+
+    def test_invalid_json(self):
+        """Test invalid JSON handling; model_validate_json raises a
+        ValidationError for malformed input"""
+        response = self.handler(_MALFORMED_REQUEST)
+
         # Assertions
         self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 500)
-        
+        self.assertEqual(response.status_code, 400)
+
         # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='inspect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='inspect_file', status='error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='inspect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.time.perf_counter')
-    @patch('app.pubsub.internal_functions.instrumented_ext_get_file_status')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_inspect_file_timing_measurement(self, mock_req_latency, mock_req_count,
-                                           mock_active_requests, mock_get_file_status,
-                                           mock_perf_counter):
+        _assert_metrics(self, self.method_name, 'error')
+
+    def test_timing_measurement(self):
         """Test that timing measurements are correct"""
-        # Setup mocks
-        mock_get_file_status.return_value = self.file_status_result
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Mock the timer
-        mock_perf_counter.side_effect = [100.0, 101.5]  # Start and end times (1.5s difference)
-        
-        # Call the function
-        response = self.inspect_file_func(self.valid_request)
-        
+        self._swap(self.ext_attr, MagicMock(return_value=(_FILE_RESULT_JSON, _FILE_RESULT)))
+        # Stub the whole time module attribute rather than patching
+        # time.perf_counter itself, which would leak into other modules
+        mock_time = MagicMock()
+        # Start and end times (1.5s difference)
+        mock_time.perf_counter.side_effect = [100.0, 101.5]
+        self._swap('time', mock_time)
+        response = self.handler(self.valid_request)
+
         # Assertions
         self.assertEqual(response.status_code, 200)
-        
+
         # Verify timing measurement
-        mock_req_latency.labels.assert_called_with(method='inspect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once_with(1.5)
+        self.mock_latency.__getitem__.assert_called_with(self.method_name)
+        self.mock_latency.__getitem__.return_value.observe.assert_called_once_with(1.5)
 
 
-import unittest
-from unittest.mock import patch, MagicMock
-import json
+class TestInspectFile(_HandlerTestMixin, unittest.TestCase):
+    method_name = 'inspect_file'
+    handler = staticmethod(app.pubsub.internal_functions.inspect_file)
+    model_cls = FileData
+    ext_attr = 'instrumented_ext_get_file_status'
+    model_attr = 'FileData'
+    valid_data = _VALID_INSPECT
+    valid_request = _FakeRequest(_VALID_INSPECT_JSON)
+    invalid_request = _FakeRequest(_INVALID_INSPECT_JSON)
+    model_fixture = _FILE_DATA_FIXTURE
 
-from dapr.ext.grpc import InvokeMethodRequest, InvokeMethodResponse, App
-from app.pubsub.models import ProtectFileData, UnprotectFileData
-import app.pubsub.internal_functions
 
-class TestProtectFile(unittest.TestCase):
-    
-    def setUp(self):
-        # Setup test data
-        self.valid_data = {
-            "file": "/test/path/file.docx",
-            "application_id": "test-app-id-123",
-            "scc_token": "scc-token-123",
-            "user": "test-user",
-            "encrypted_file": "encrypted-content"
-        }
-
-        self.invalid_data = {
-            "file": "/test/path/file.docx",
-            "application_id": "test-app-id-123",
-            "scc_token": "scc-token-123",
-            # Missing required fields
-        }
-        
-        # Mock request with valid data
-        self.valid_request = MagicMock(spec=InvokeMethodRequest)
-        self.valid_request.text.return_value = json.dumps(self.valid_data)
-        self.valid_request.metadata = {"Content-Type": "application/json"}
-
-        # Mock request with invalid data
-        self.invalid_request = MagicMock(spec=InvokeMethodRequest)
-        self.invalid_request.text.return_value = json.dumps(self.invalid_data)
-        self.invalid_request.metadata = {"Content-Type": "application/json"}
-        
-        # Mock file status result
-        self.protect_result = dict(
-            status=True,
-            path="/test/path/file.docx",
-            error=""
-        )
-        
-        # Get the function to test
-        self.protect_file_func = app.pubsub.internal_functions.protect_file
-
-    @patch('app.pubsub.internal_functions.instrumented_ext_protect_file')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_protect_file_success(self, mock_req_latency, mock_req_count, 
-                                mock_active_requests, mock_ext_unprotect_file):
-        """Test successful file protection by directly calling the function"""
-        # Setup mocks
-        mock_ext_unprotect_file.return_value = self.protect_result
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function directly
-        response = self.protect_file_func(self.valid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 200)
-        
-        # Verify the response data
-        response_data = json.loads(response.data.decode())
-        self.assertTrue(response_data["status"])
-        self.assertEqual(response_data["path"], "/test/path/file.docx")
-        self.assertEqual(response_data["error"], "")
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='protect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='protect_file', status='success')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='protect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-        
-        # Verify external function call
-        mock_ext_unprotect_file.assert_called_once()
-        protect_data = mock_ext_unprotect_file.call_args[0][0]
-        self.assertIsInstance(protect_data, ProtectFileData)
-        self.assertEqual(protect_data.file, self.valid_data["file"])
-        self.assertEqual(protect_data.application_id, self.valid_data["application_id"])
-        self.assertEqual(protect_data.scc_token, self.valid_data["scc_token"])
-        self.assertEqual(protect_data.user, self.valid_data["user"])
-        self.assertEqual(protect_data.encrypted_file, self.valid_data["encrypted_file"])
-
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_protect_file_validation_error(self, mock_req_latency, mock_req_count, 
-                                         mock_active_requests):
-        """Test validation error handling for protect_file"""
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function with invalid data
-        response = self.protect_file_func(self.invalid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 400)
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='protect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='protect_file', status='validation_error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='protect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.ProtectFileData')
-    @patch('app.pubsub.internal_functions.instrumented_ext_protect_file')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_protect_file_general_exception(self, mock_req_latency, mock_req_count, 
-                                         mock_active_requests, mock_ext_unprotect_file,
-                                         mock_protect_file_data):
-        """Test general exception handling in protect_file"""
-        # Setup mocks
-        mock_protect_file_data.return_value = ProtectFileData(**self.valid_data)
-        mock_ext_unprotect_file.side_effect = Exception("File processing error")
-        
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function
-        response = self.protect_file_func(self.valid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 500)
-        self.assertIn("File processing error", response.data.decode())
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='protect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='protect_file', status='error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='protect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.json.loads')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_protect_file_invalid_json(self, mock_req_latency, mock_req_count, 
-                                    mock_active_requests, mock_json_loads):
-        """Test invalid JSON handling in protect_file"""
-        # Setup mocks
-        mock_json_loads.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
-        
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Create request with invalid JSON
-        invalid_request = MagicMock(spec=InvokeMethodRequest)
-        invalid_request.text.return_value = "{invalid json"
-        invalid_request.metadata = {}
-        
-        # Call the function
-        response = self.protect_file_func(invalid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 500)
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='protect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='protect_file', status='error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='protect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-
-class TestUnprotectFile(unittest.TestCase):
-    
-    def setUp(self):
-        # Setup test data
-        self.valid_data = {
-            "file": "/test/path/file.docx",
-            "application_id": "test-app-id-123",
-            "scc_token": "scc-token-123"
-        }
-
-        self.invalid_data = {
-            "file": "/test/path/file.docx",
-            "application_id": "test-app-id-123"
-            # Missing scc_token
-        }
-        
-        # Mock request with valid data
-        self.valid_request = MagicMock(spec=InvokeMethodRequest)
-        self.valid_request.text.return_value = json.dumps(self.valid_data)
-        self.valid_request.metadata = {"Content-Type": "application/json"}
-
-        # Mock request with invalid data
-        self.invalid_request = MagicMock(spec=InvokeMethodRequest)
-        self.invalid_request.text.return_value = json.dumps(self.invalid_data)
-        self.invalid_request.metadata = {"Content-Type": "application/json"}
-        
-        # Mock file status result
-        self.unprotect_result = dict(
-            status=True,
-            path="/test/path/file.docx",
-            error=""
-        )
-        
-        # Get the function to test
-        self.unprotect_file_func = app.pubsub.internal_functions.unprotect_file
-
-    @patch('app.pubsub.internal_functions.instrumented_ext_unprotect_file')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_unprotect_file_success(self, mock_req_latency, mock_req_count, 
-                                   mock_active_requests, mock_ext_protect_file):
-        """Test successful file unprotection by directly calling the function"""
-        # Setup mocks
-        mock_ext_protect_file.return_value = self.unprotect_result
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function directly
-        response = self.unprotect_file_func(self.valid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 200)
-        
-        # Verify the response data
-        response_data = json.loads(response.data.decode())
-        self.assertTrue(response_data["status"])
-        self.assertEqual(response_data["path"], "/test/path/file.docx")
-        self.assertEqual(response_data["error"], "")
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='unprotect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='unprotect_file', status='success')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='unprotect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-        
-        # Verify external function call
-        mock_ext_protect_file.assert_called_once()
-        unprotect_data = mock_ext_protect_file.call_args[0][0]
-        self.assertIsInstance(unprotect_data, UnprotectFileData)
-        self.assertEqual(unprotect_data.file, self.valid_data["file"])
-        self.assertEqual(unprotect_data.application_id, self.valid_data["application_id"])
-        self.assertEqual(unprotect_data.scc_token, self.valid_data["scc_token"])
-
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_unprotect_file_validation_error(self, mock_req_latency, mock_req_count, 
-                                           mock_active_requests):
-        """Test validation error handling for unprotect_file"""
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function with invalid data
-        response = self.unprotect_file_func(self.invalid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 400)
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='unprotect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='unprotect_file', status='validation_error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='unprotect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.UnprotectFileData')
-    @patch('app.pubsub.internal_functions.instrumented_ext_unprotect_file')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_unprotect_file_general_exception(self, mock_req_latency, mock_req_count, 
-                                            mock_active_requests, mock_ext_protect_file,
-                                            mock_unprotect_file_data):
-        """Test general exception handling in unprotect_file"""
-        # Setup mocks
-        mock_unprotect_file_data.return_value = UnprotectFileData(**self.valid_data)
-        mock_ext_protect_file.side_effect = Exception("File processing error")
-        
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Call the function
-        response = self.unprotect_file_func(self.valid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 500)
-        self.assertIn("File processing error", response.data.decode())
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='unprotect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='unprotect_file', status='error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='unprotect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
-
-    @patch('app.pubsub.internal_functions.json.loads')
-    @patch('app.pubsub.internal_functions.metrics_active_requests')
-    @patch('app.pubsub.internal_functions.metrics_req_count')
-    @patch('app.pubsub.internal_functions.metrics_req_latency')
-    def test_unprotect_file_invalid_json(self, mock_req_latency, mock_req_count, 
-                                       mock_active_requests, mock_json_loads):
-        """Test invalid JSON handling in unprotect_file"""
-        # Setup mocks
-        mock_json_loads.side_effect = json.JSONDecodeError("Invalid JSON", "", 0)
-        
-        mock_active_requests.labels.return_value = MagicMock()
-        mock_req_count.labels.return_value = MagicMock()
-        mock_req_latency.labels.return_value = MagicMock()
-        
-        # Create request with invalid JSON
-        invalid_request = MagicMock(spec=InvokeMethodRequest)
-        invalid_request.text.return_value = "{invalid json"
-        invalid_request.metadata = {}
-        
-        # Call the function
-        response = self.unprotect_file_func(invalid_request)
-        
-        # Assertions
-        self.assertIsInstance(response, InvokeMethodResponse)
-        self.assertEqual(response.status_code, 500)
-        
-        # Verify metrics calls
-        mock_active_requests.labels.assert_called_with(method='unprotect_file')
-        mock_active_requests.labels.return_value.inc.assert_called_once()
-        mock_active_requests.labels.return_value.dec.assert_called_once()
-        
-        mock_req_count.labels.assert_called_with(method='unprotect_file', status='error')
-        mock_req_count.labels.return_value.inc.assert_called_once()
-        
-        mock_req_latency.labels.assert_called_with(method='unprotect_file')
-        mock_req_latency.labels.return_value.observe.assert_called_once()
+class TestProtectFile(_HandlerTestMixin, unittest.TestCase):
+    method_name = 'protect_file'
+    handler = staticmethod(app.pubsub.internal_functions.protect_file)
+    model_cls = ProtectFileData
+    ext_attr = 'instrumented_ext_protect_file'
+    model_attr = 'ProtectFileData'
+    valid_data = _VALID_PROTECT
+    valid_request = _FakeRequest(_VALID_PROTECT_JSON)
+    invalid_request = _FakeRequest(_INVALID_PROTECT_JSON)
+    model_fixture = _PROTECT_FIXTURE
+
 
+class TestUnprotectFile(_HandlerTestMixin, unittest.TestCase):
+    method_name = 'unprotect_file'
+    handler = staticmethod(app.pubsub.internal_functions.unprotect_file)
+    model_cls = UnprotectFileData
+    ext_attr = 'instrumented_ext_unprotect_file'
+    model_attr = 'UnprotectFileData'
+    valid_data = _VALID_UNPROTECT
+    valid_request = _FakeRequest(_VALID_UNPROTECT_JSON)
+    invalid_request = _FakeRequest(_INVALID_UNPROTECT_JSON)
+    model_fixture = _UNPROTECT_FIXTURE